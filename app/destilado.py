@@ -0,0 +1,270 @@
+"""
+Construcción del modelo rápido (árbol destilado del Random Forest)
+
+Uso:
+    python -m app.destilado --muestras 200000 --profundidad 12 --acuerdo-objetivo 0.99
+"""
+import os
+import sys
+import json
+import time
+import pickle
+import argparse
+import numpy as np
+from pathlib import Path
+from typing import Dict, Optional
+from datetime import datetime
+from sklearn.tree import DecisionTreeRegressor
+from app.formatos import RESTRICCIONES_CAMPOS, CAMPOS_CATEGORICOS
+
+
+# Rangos de muestreo para los campos que en `DatosEstudiante` no tienen máximo (o mínimo)
+RANGOS_MUESTREO = {
+    'velocidad_progreso': (0.0, 10.0),
+    'mejora_tendencia': (-1.0, 1.0),
+    'lecciones_completadas': (0, 50),
+    'lecciones_totales': (1, 50),
+    'tiempo_promedio_por_sesion_min': (0.0, 120.0),
+}
+
+# Fracción de estudiantes sin estilos (los tres en 0, su valor por defecto), para que
+# el árbol aprenda el caso en que las features de estilo salen de `estilo_dominante`
+FRACCION_SIN_ESTILOS = 0.25
+
+UMBRALES_REPORTE = [0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 0.99]
+
+# Umbrales probados al elegir el umbral automáticamente
+UMBRALES_CANDIDATOS = [round(float(u), 2) for u in np.arange(0.0, 1.0001, 0.01)]
+
+# Tasa de escalamiento a partir de la cual el nivel rápido casi no se usa
+ESCALAMIENTO_ALERTA = 0.95
+
+
+def muestrear_estudiantes(n: int, rng: np.random.Generator) -> Dict[str, np.ndarray]:
+    """
+    Genera estudiantes sintéticos uniformes dentro de los rangos de `DatosEstudiante`,
+    con lecciones completadas que no superan las totales y una parte sin estilos
+
+    Args:
+        n: Número de estudiantes
+        rng: Generador aleatorio de numpy
+
+    Returns:
+        Diccionario campo -> array, en el formato de `leer_columnas`
+    """
+    columnas = {}
+    for campo, valores in CAMPOS_CATEGORICOS.items():
+        columnas[campo] = rng.choice(np.array(valores), size=n)
+
+    for campo, r in RESTRICCIONES_CAMPOS.items():
+        minimo, maximo = RANGOS_MUESTREO.get(campo, (r["minimo"], r["maximo"]))
+        if r["entero"]:
+            columnas[campo] = rng.integers(int(minimo), int(maximo) + 1, size=n).astype(np.float64)
+        else:
+            columnas[campo] = rng.uniform(minimo, maximo, size=n)
+
+    # Las lecciones completadas se muestrean entre 0 y las totales de cada estudiante
+    columnas['lecciones_completadas'] = rng.integers(
+        0, columnas['lecciones_totales'].astype(np.int64) + 1
+    ).astype(np.float64)
+
+    sin_estilos = rng.random(n) < FRACCION_SIN_ESTILOS
+    for campo in ('estilo_visual', 'estilo_auditivo', 'estilo_kinestesico'):
+        columnas[campo][sin_estilos] = 0.0
+
+    return columnas
+
+
+def _percentiles_ms(tiempos: list) -> dict:
+    ms = np.array(tiempos) * 1000
+    return {
+        "p50": float(np.percentile(ms, 50)),
+        "p95": float(np.percentile(ms, 95)),
+        "p99": float(np.percentile(ms, 99)),
+        "media": float(ms.mean())
+    }
+
+
+def _evaluar_umbral(confianza: np.ndarray, acierta: np.ndarray,
+                    error_confianza: np.ndarray, umbral: float) -> dict:
+    rapido = confianza >= umbral
+    return {
+        "tasa_escalamiento": float(1 - rapido.mean()),
+        "acuerdo_nivel_rapido": float(acierta[rapido].mean()) if rapido.any() else None,
+        "error_confianza_nivel_rapido": float(error_confianza[rapido].mean()) if rapido.any() else None,
+        # Las filas escaladas las responde el bosque, así que coinciden siempre
+        "acuerdo_total": float((acierta | ~rapido).mean())
+    }
+
+
+def elegir_umbral(confianza: np.ndarray, acierta: np.ndarray, acuerdo_objetivo: float) -> float:
+    """
+    Elige el menor umbral cuyo acuerdo total con el bosque alcanza el objetivo
+    (el acuerdo total solo crece al subir el umbral, a costa de escalar más filas)
+
+    Args:
+        confianza: Confianza del árbol en cada fila
+        acierta: Si el árbol coincide con la ruta del bosque en cada fila
+        acuerdo_objetivo: Acuerdo total mínimo (0-1)
+
+    Returns:
+        Umbral elegido; el mayor candidato si ninguno alcanza el objetivo
+    """
+    for umbral in UMBRALES_CANDIDATOS:
+        if (acierta | (confianza < umbral)).mean() >= acuerdo_objetivo:
+            return umbral
+    return UMBRALES_CANDIDATOS[-1]
+
+
+def construir_destilado(predictor, muestras: int = 200000, profundidad: int = 12,
+                        umbral: Optional[float] = None, acuerdo_objetivo: float = 0.99,
+                        semilla: int = 42, muestras_latencia: int = 500) -> dict:
+    """
+    Entrena un árbol de regresión poco profundo sobre las probabilidades del bosque
+    (cada hoja guarda la media de `predict_proba` de sus muestras) y lo guarda
+    junto al metadata del modelo, con un reporte de acuerdo y latencias
+
+    Args:
+        predictor: PredictorRutas con el bosque cargado
+        muestras: Estudiantes sintéticos de entrenamiento (se reserva un 10% para
+            elegir el umbral y otro 10% para evaluar)
+        profundidad: Profundidad máxima del árbol
+        umbral: Confianza mínima del árbol para no escalar al bosque; si es None se
+            elige con `elegir_umbral`
+        acuerdo_objetivo: Acuerdo total buscado al elegir el umbral automáticamente
+        semilla: Semilla del muestreo
+        muestras_latencia: Filas individuales usadas para medir la latencia de cada nivel
+
+    Returns:
+        Reporte con acuerdo, tasa de escalamiento y latencias
+    """
+    rng = np.random.default_rng(semilla)
+    columnas = muestrear_estudiantes(muestras, rng)
+    x = predictor.scaler.transform(predictor._preparar_features_columnas(columnas))
+    prob_bosque = predictor.modelo.predict_proba(x)
+
+    corte = int(len(x) * 0.8)
+    corte_calibracion = int(len(x) * 0.9)
+    x_train, prob_train = x[:corte], prob_bosque[:corte]
+    x_cal, prob_cal = x[corte:corte_calibracion], prob_bosque[corte:corte_calibracion]
+    x_eval, prob_eval = x[corte_calibracion:], prob_bosque[corte_calibracion:]
+
+    # Se destilan las probabilidades (no las etiquetas), así la confianza del
+    # árbol aproxima la del bosque y el umbral filtra los casos dudosos
+    arbol = DecisionTreeRegressor(max_depth=profundidad, min_samples_leaf=20, random_state=semilla)
+    arbol.fit(x_train, prob_train)
+
+    # El umbral se elige con filas distintas de las que miden el acuerdo reportado
+    umbral_manual = umbral is not None
+    if not umbral_manual:
+        prob_arbol_cal = arbol.predict(x_cal)
+        umbral = elegir_umbral(
+            prob_arbol_cal.max(axis=1),
+            prob_arbol_cal.argmax(axis=1) == prob_cal.argmax(axis=1),
+            acuerdo_objetivo
+        )
+
+    prob_arbol = arbol.predict(x_eval)
+    confianza = prob_arbol.max(axis=1)
+    acierta = prob_arbol.argmax(axis=1) == prob_eval.argmax(axis=1)
+    error_confianza = np.abs(confianza - prob_eval.max(axis=1))
+
+    umbrales = {
+        str(u): _evaluar_umbral(confianza, acierta, error_confianza, u)
+        for u in sorted(set(UMBRALES_REPORTE + [umbral]))
+    }
+
+    tasa_escalamiento = umbrales[str(umbral)]["tasa_escalamiento"]
+    if tasa_escalamiento >= ESCALAMIENTO_ALERTA:
+        print(f"Advertencia: Con umbral {umbral} se escala al bosque el {tasa_escalamiento:.1%} de las filas; "
+              f"el modelo rápido casi no se usará (prueba más profundidad o un acuerdo objetivo menor)")
+
+    # Latencia por fila individual de cada nivel
+    tiempos_rapido, tiempos_bosque = [], []
+    for fila in x_eval[:muestras_latencia]:
+        fila = fila.reshape(1, -1)
+        inicio = time.perf_counter()
+        arbol.predict(fila)
+        tiempos_rapido.append(time.perf_counter() - inicio)
+        inicio = time.perf_counter()
+        predictor.modelo.predict_proba(fila)
+        tiempos_bosque.append(time.perf_counter() - inicio)
+
+    reporte = {
+        "fecha": datetime.now().isoformat(),
+        "metadata_origen": predictor.archivo_metadata.name,
+        "muestras_entrenamiento": int(corte),
+        "muestras_calibracion": int(len(x_cal)),
+        "muestras_evaluacion": int(len(x_eval)),
+        "profundidad": int(arbol.get_depth()),
+        "hojas": int(arbol.get_n_leaves()),
+        "umbral": umbral,
+        "umbral_manual": umbral_manual,
+        "acuerdo_objetivo": None if umbral_manual else acuerdo_objetivo,
+        "acuerdo_sin_escalar": float(acierta.mean()),
+        "error_confianza_medio": float(error_confianza.mean()),
+        "confianza_percentiles": {
+            "p5": float(np.percentile(confianza, 5)),
+            "p50": float(np.percentile(confianza, 50)),
+            "p95": float(np.percentile(confianza, 95))
+        },
+        "tasa_escalamiento": tasa_escalamiento,
+        "acuerdo_total": umbrales[str(umbral)]["acuerdo_total"],
+        "por_umbral": umbrales,
+        "latencia_ms": {
+            "rapido": _percentiles_ms(tiempos_rapido),
+            "bosque": _percentiles_ms(tiempos_bosque)
+        }
+    }
+
+    # Guardar junto al metadata, con su mismo timestamp
+    sufijo = predictor.archivo_metadata.stem.replace("metadata_", "", 1)
+    directorio = predictor.archivo_metadata.parent
+    with open(directorio / f"destilado_{sufijo}.pkl", 'wb') as f:
+        pickle.dump({
+            "modelo": arbol,
+            "umbral": umbral,
+            "clases": predictor.modelo.classes_.tolist(),
+            "features": predictor.features,
+            "metadata_origen": predictor.archivo_metadata.name
+        }, f)
+    with open(directorio / f"destilado_{sufijo}.json", 'w', encoding='utf-8') as f:
+        json.dump(reporte, f, indent=2, ensure_ascii=False)
+
+    return reporte
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Construye el modelo rápido destilado del bosque")
+    parser.add_argument("--modelos-dir", default=os.getenv("MODELOS_DIR", "modelos"))
+    parser.add_argument("--muestras", type=int, default=200000)
+    parser.add_argument("--profundidad", type=int, default=12)
+    parser.add_argument("--umbral", type=float, default=None,
+                        help="Umbral fijo; por defecto se elige según --acuerdo-objetivo")
+    parser.add_argument("--acuerdo-objetivo", type=float, default=0.99,
+                        help="Acuerdo total mínimo con el bosque al elegir el umbral")
+    parser.add_argument("--semilla", type=int, default=42)
+    args = parser.parse_args()
+
+    from app.predictor import PredictorRutas
+
+    predictor = PredictorRutas(modelos_dir=args.modelos_dir)
+    reporte = construir_destilado(
+        predictor,
+        muestras=args.muestras,
+        profundidad=args.profundidad,
+        umbral=args.umbral,
+        acuerdo_objetivo=args.acuerdo_objetivo,
+        semilla=args.semilla
+    )
+
+    print(f"Acuerdo del árbol con el bosque: {reporte['acuerdo_sin_escalar']:.2%}")
+    print(f"Umbral {reporte['umbral']}: escalamiento {reporte['tasa_escalamiento']:.2%}, "
+          f"acuerdo total {reporte['acuerdo_total']:.2%}")
+    for nivel, lat in reporte["latencia_ms"].items():
+        print(f"Latencia {nivel}: p50 {lat['p50']:.3f} ms, p95 {lat['p95']:.3f} ms, p99 {lat['p99']:.3f} ms")
+    print(f"Guardado en {Path(args.modelos_dir).resolve()}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
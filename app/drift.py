@@ -0,0 +1,256 @@
+"""
+Monitoreo de deriva (drift) de las features de entrada y de las rutas predichas
+"""
+import json
+import threading
+import numpy as np
+from pathlib import Path
+from typing import Optional, List
+from datetime import datetime
+
+
+# Bordes de los bins en el espacio escalado (desviaciones estándar del entrenamiento).
+# Los bins de los extremos son abiertos, así que la memoria es fija sin importar los datos.
+BORDES_BINS = np.linspace(-4.0, 4.0, 17)
+
+# Suavizado para evitar log(0) en el PSI
+EPSILON_PSI = 1e-4
+
+
+def calcular_psi(actual: np.ndarray, referencia: np.ndarray) -> np.ndarray:
+    """
+    Calcula el Population Stability Index (PSI) sobre el último eje
+
+    Args:
+        actual: Conteos observados actualmente
+        referencia: Conteos de la línea base
+
+    Returns:
+        Array con el PSI (un valor por fila si las entradas son 2D)
+    """
+    p = actual / np.maximum(actual.sum(axis=-1, keepdims=True), 1)
+    q = referencia / np.maximum(referencia.sum(axis=-1, keepdims=True), 1)
+    p = np.clip(p, EPSILON_PSI, None)
+    q = np.clip(q, EPSILON_PSI, None)
+    return np.sum((p - q) * np.log(p / q), axis=-1)
+
+
+class MonitorDrift:
+    """Sketches de memoria fija que se actualizan con cada predicción"""
+
+    def __init__(self, features: List[str], clases: np.ndarray,
+                 tamano_buffer: int = 256, archivo_baseline: Optional[Path] = None,
+                 min_observaciones: int = 500):
+        """
+        Inicializa los histogramas por feature y los conteos por ruta
+
+        Args:
+            features: Nombres de las features en el orden del modelo
+            clases: Clases del modelo (rutas)
+            tamano_buffer: Filas acumuladas antes de incorporarlas a los histogramas
+            archivo_baseline: Archivo JSON donde se guarda la línea base
+            min_observaciones: Filas mínimas en la ventana para reportar el PSI
+        """
+        self.features = list(features)
+        self.clases = np.asarray(clases)
+        self.tamano_buffer = max(int(tamano_buffer), 1)
+        self.archivo_baseline = Path(archivo_baseline) if archivo_baseline else None
+        self.min_observaciones = max(int(min_observaciones), 1)
+
+        num_features = len(self.features)
+        self.num_bins = len(BORDES_BINS) + 1
+
+        self._lock = threading.Lock()
+        self._buffer_x = np.empty((self.tamano_buffer, num_features), dtype=np.float64)
+        self._buffer_y = np.empty(self.tamano_buffer, dtype=np.int64)
+        self._pos = 0
+
+        self._reiniciar_ventana()
+
+        self.baseline = None
+        self._cargar_baseline()
+
+    def _reiniciar_ventana(self):
+        """Vacía los sketches de la ventana actual (debe llamarse con el lock tomado o al inicializar)"""
+        num_features = len(self.features)
+        self.histogramas = np.zeros((num_features, self.num_bins), dtype=np.int64)
+        self.conteo_clases = np.zeros(len(self.clases), dtype=np.int64)
+        self.suma = np.zeros(num_features, dtype=np.float64)
+        self.suma_cuadrados = np.zeros(num_features, dtype=np.float64)
+        self.total = 0
+        self.inicio_ventana = datetime.now().isoformat()
+
+    def registrar(self, features_scaled: np.ndarray, indices_clase: np.ndarray):
+        """
+        Agrega filas ya escaladas al buffer y lo incorpora cuando se llena
+
+        Args:
+            features_scaled: Matriz (n, num_features) ya escalada
+            indices_clase: Índice (en `clases`) de la ruta predicha para cada fila
+        """
+        features_scaled = np.atleast_2d(features_scaled)
+        indices_clase = np.atleast_1d(indices_clase)
+
+        with self._lock:
+            inicio = 0
+            n = features_scaled.shape[0]
+            while inicio < n:
+                cantidad = min(self.tamano_buffer - self._pos, n - inicio)
+                fin_buffer = self._pos + cantidad
+                self._buffer_x[self._pos:fin_buffer] = features_scaled[inicio:inicio + cantidad]
+                self._buffer_y[self._pos:fin_buffer] = indices_clase[inicio:inicio + cantidad]
+                self._pos = fin_buffer
+                inicio += cantidad
+                if self._pos == self.tamano_buffer:
+                    self._incorporar_buffer()
+
+    def _incorporar_buffer(self):
+        """Incorpora las filas del buffer a los sketches (debe llamarse con el lock tomado)"""
+        if self._pos == 0:
+            return
+
+        x = self._buffer_x[:self._pos]
+        y = self._buffer_y[:self._pos]
+        num_features = x.shape[1]
+
+        # Un solo searchsorted + bincount para todas las features a la vez
+        bins = np.searchsorted(BORDES_BINS, x, side='right')
+        bins += np.arange(num_features) * self.num_bins
+        self.histogramas += np.bincount(
+            bins.ravel(), minlength=num_features * self.num_bins
+        ).reshape(num_features, self.num_bins)
+
+        self.conteo_clases += np.bincount(y, minlength=len(self.clases))
+        self.suma += x.sum(axis=0)
+        self.suma_cuadrados += np.square(x).sum(axis=0)
+        self.total += self._pos
+        self._pos = 0
+
+    def _cargar_baseline(self):
+        """Carga la línea base desde disco si existe y es compatible"""
+        if self.archivo_baseline is None or not self.archivo_baseline.exists():
+            return
+
+        try:
+            with open(self.archivo_baseline, 'r', encoding='utf-8') as f:
+                datos = json.load(f)
+
+            histogramas = np.asarray(datos['histogramas'], dtype=np.int64)
+            conteo_clases = np.asarray(datos['conteo_clases'], dtype=np.int64)
+            if (datos.get('features') != self.features
+                    or datos.get('clases') != self.clases.tolist()
+                    or histogramas.shape != self.histogramas.shape
+                    or conteo_clases.shape != self.conteo_clases.shape):
+                print(f"Advertencia: La línea base de drift en {self.archivo_baseline} no es compatible con el modelo")
+                return
+
+            self.baseline = {
+                "fecha": datos.get('fecha'),
+                "total": int(datos.get('total', 0)),
+                "histogramas": histogramas,
+                "conteo_clases": conteo_clases
+            }
+        except Exception as e:
+            print(f"Advertencia: No se pudo cargar la línea base de drift: {str(e)}")
+
+    def fijar_baseline(self) -> dict:
+        """
+        Toma una instantánea de los sketches actuales como línea base, la guarda en disco
+        y empieza una ventana nueva, de modo que el drift posterior se compara solo con
+        las filas recibidas después de fijar la línea base
+
+        Returns:
+            Diccionario con la fecha y el total de filas de la línea base
+        """
+        with self._lock:
+            self._incorporar_buffer()
+            if self.total == 0:
+                raise ValueError("No hay predicciones registradas para fijar la línea base")
+
+            self.baseline = {
+                "fecha": datetime.now().isoformat(),
+                "total": self.total,
+                "histogramas": self.histogramas.copy(),
+                "conteo_clases": self.conteo_clases.copy()
+            }
+            baseline = self.baseline
+            self._reiniciar_ventana()
+
+        if self.archivo_baseline is not None:
+            with open(self.archivo_baseline, 'w', encoding='utf-8') as f:
+                json.dump({
+                    "fecha": baseline["fecha"],
+                    "total": baseline["total"],
+                    "features": self.features,
+                    "clases": self.clases.tolist(),
+                    "bordes_bins": BORDES_BINS.tolist(),
+                    "histogramas": baseline["histogramas"].tolist(),
+                    "conteo_clases": baseline["conteo_clases"].tolist()
+                }, f)
+
+        return {"fecha": baseline["fecha"], "total": baseline["total"]}
+
+    def obtener_reporte(self) -> dict:
+        """
+        Calcula los puntajes de drift frente a la línea base y al entrenamiento
+
+        Returns:
+            Diccionario con el resumen por feature y por ruta
+        """
+        with self._lock:
+            self._incorporar_buffer()
+            total = self.total
+            inicio_ventana = self.inicio_ventana
+            histogramas = self.histogramas.copy()
+            conteo_clases = self.conteo_clases.copy()
+            suma = self.suma.copy()
+            suma_cuadrados = self.suma_cuadrados.copy()
+            baseline = self.baseline
+
+        reporte = {
+            "total_observaciones": total,
+            "inicio_ventana": inicio_ventana,
+            "tamano_buffer": self.tamano_buffer,
+            "min_observaciones": self.min_observaciones,
+            # Con pocas filas el PSI es puro ruido de muestreo y no se reporta
+            "suficiente": total >= self.min_observaciones,
+            "baseline": None,
+            "features": {},
+            "rutas": {}
+        }
+        if total == 0:
+            return reporte
+
+        # En el espacio escalado el entrenamiento tiene media 0 y desviación 1
+        media = suma / total
+        desviacion = np.sqrt(np.maximum(suma_cuadrados / total - np.square(media), 0.0))
+
+        psi_features = None
+        psi_rutas = None
+        if baseline is not None:
+            reporte["baseline"] = {
+                "fecha": baseline["fecha"],
+                "total": baseline["total"]
+            }
+        if baseline is not None and reporte["suficiente"]:
+            psi_features = calcular_psi(histogramas, baseline["histogramas"])
+            psi_rutas = float(calcular_psi(conteo_clases, baseline["conteo_clases"]))
+
+        for i, feature in enumerate(self.features):
+            reporte["features"][feature] = {
+                "media_escalada": float(media[i]),
+                "desviacion_escalada": float(desviacion[i]),
+                "psi": float(psi_features[i]) if psi_features is not None else None
+            }
+
+        reporte["rutas"] = {
+            "frecuencias": {
+                str(int(clase)): int(conteo)
+                for clase, conteo in zip(self.clases, conteo_clases)
+            },
+            "psi": psi_rutas
+        }
+        if psi_features is not None:
+            reporte["psi_maximo"] = float(np.max(psi_features))
+
+        return reporte
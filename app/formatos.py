@@ -0,0 +1,321 @@
+"""
+Formatos de intercambio para predicciones batch (JSON, MessagePack y Apache Arrow IPC)
+"""
+import io
+import os
+import json
+import numpy as np
+from typing import Dict, Tuple
+from app.models import DatosEstudiante
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+
+MIME_JSON = "application/json"
+MIME_MSGPACK = "application/x-msgpack"
+MIME_ARROW = "application/vnd.apache.arrow.stream"
+
+FORMATOS_SOPORTADOS = [MIME_JSON, MIME_MSGPACK, MIME_ARROW]
+
+# Formatos que se pueden ofrecer en la respuesta: msgpack y pyarrow son opcionales
+FORMATOS_DISPONIBLES = (
+    [MIME_JSON]
+    + ([MIME_MSGPACK] if msgpack is not None else [])
+    + ([MIME_ARROW] if pa is not None else [])
+)
+
+# Los archivos Arrow IPC (no los streams) empiezan con estos bytes
+MAGIC_ARROW_ARCHIVO = b"ARROW1"
+
+# Alias aceptados en Content-Type
+ALIAS_MIME = {
+    "application/msgpack": MIME_MSGPACK,
+    "application/vnd.msgpack": MIME_MSGPACK,
+    "application/vnd.apache.arrow.file": MIME_ARROW,
+}
+
+CAMPOS_CATEGORICOS = {
+    'ritmo_aprendizaje': ['LENTO', 'NORMAL', 'RAPIDO'],
+    'estilo_dominante': ['VISUAL', 'AUDITIVO', 'KINESTESICO', 'MIXTO'],
+}
+
+# Columnas que solo aparecen con votación anticipada
+CAMPOS_OPCIONALES_RESULTADO = ['arboles_usados', 'ruta_exacta', 'probabilidades_exactas']
+
+
+class FormatoNoSoportado(Exception):
+    """El formato pedido no es conocido o su librería no está instalada"""
+    pass
+
+
+def _restricciones_campos() -> Dict[str, dict]:
+    """
+    Extrae de `DatosEstudiante` los límites, tipos y valores por defecto de los campos numéricos
+
+    Returns:
+        Diccionario campo -> {minimo, maximo, entero, requerido, default}
+    """
+    esquema = DatosEstudiante.schema()
+    requeridos = set(esquema.get("required", []))
+    restricciones = {}
+    for nombre, prop in esquema["properties"].items():
+        if nombre in CAMPOS_CATEGORICOS:
+            continue
+        # Los campos Optional aparecen como anyOf [{...}, {"type": "null"}]
+        opciones = [o for o in prop.get("anyOf", [prop]) if o.get("type") != "null"]
+        opcion = opciones[0] if opciones else prop
+        restricciones[nombre] = {
+            "minimo": opcion.get("minimum"),
+            "maximo": opcion.get("maximum"),
+            "entero": opcion.get("type") == "integer",
+            "requerido": nombre in requeridos,
+            "default": prop.get("default", 0.0)
+        }
+    return restricciones
+
+
+RESTRICCIONES_CAMPOS = _restricciones_campos()
+
+
+def normalizar_mime(mimetype: str) -> str:
+    """Normaliza un Content-Type a uno de los formatos soportados"""
+    mimetype = (mimetype or MIME_JSON).lower()
+    return ALIAS_MIME.get(mimetype, mimetype)
+
+
+def mime_por_extension(nombre_archivo: str) -> str:
+    """Deduce el formato de un archivo subido a partir de su extensión"""
+    extension = os.path.splitext(nombre_archivo or "")[1].lower()
+    return {
+        ".msgpack": MIME_MSGPACK,
+        ".mpk": MIME_MSGPACK,
+        ".arrow": MIME_ARROW,
+        ".arrows": MIME_ARROW,
+    }.get(extension, MIME_JSON)
+
+
+def es_formato_binario(mimetype: str) -> bool:
+    """Indica si el formato es MessagePack o Arrow"""
+    return normalizar_mime(mimetype) in (MIME_MSGPACK, MIME_ARROW)
+
+
+def _columnas_desde_registros(registros: list) -> Dict[str, list]:
+    """Transpone una lista de estudiantes (diccionarios) a columnas"""
+    if not isinstance(registros, list) or not all(isinstance(r, dict) for r in registros):
+        raise ValueError("'estudiantes' debe ser una lista de objetos")
+    campos = set(RESTRICCIONES_CAMPOS) | set(CAMPOS_CATEGORICOS)
+    return {
+        campo: [registro.get(campo) for registro in registros]
+        for campo in campos
+        if any(campo in registro for registro in registros)
+    }
+
+
+def _columnas_desde_mapa(datos) -> Dict[str, list]:
+    """Obtiene las columnas de un cuerpo JSON/MessagePack (por registros o columnar)"""
+    if not isinstance(datos, dict):
+        raise ValueError("El cuerpo debe ser un objeto con 'estudiantes' o 'columnas'")
+    if "estudiantes" in datos:
+        return _columnas_desde_registros(datos["estudiantes"])
+    if "columnas" in datos and isinstance(datos["columnas"], dict):
+        if not all(isinstance(valores, list) for valores in datos["columnas"].values()):
+            raise ValueError("Cada entrada de 'columnas' debe ser una lista")
+        return datos["columnas"]
+    raise ValueError("El cuerpo debe ser un objeto con 'estudiantes' o 'columnas'")
+
+
+def _columnas_desde_arrow(cuerpo: bytes) -> Dict[str, object]:
+    """
+    Lee un cuerpo Arrow IPC (formato stream o formato archivo) y expone cada
+    columna como array numpy
+
+    El formato se detecta por los bytes mágicos y no por el Content-Type, porque
+    `application/vnd.apache.arrow.file` se normaliza al mismo MIME que el stream.
+    Las columnas numéricas sin nulos se mapean sin copia sobre el buffer recibido.
+    """
+    if pa is None:
+        raise FormatoNoSoportado("Formato Arrow no disponible: instala 'pyarrow'")
+
+    buffer = pa.py_buffer(cuerpo)
+    try:
+        if cuerpo[:len(MAGIC_ARROW_ARCHIVO)] == MAGIC_ARROW_ARCHIVO:
+            tabla = pa.ipc.open_file(buffer).read_all()
+        else:
+            tabla = pa.ipc.open_stream(buffer).read_all()
+    except pa.ArrowException as e:
+        raise ValueError(f"Cuerpo Arrow IPC inválido: {e}")
+    tabla = tabla.combine_chunks()
+    columnas = {}
+    for nombre in tabla.column_names:
+        columna = tabla.column(nombre)
+        arreglo = columna.chunk(0) if columna.num_chunks == 1 else columna.combine_chunks()
+        if arreglo.null_count:
+            columnas[nombre] = arreglo.to_pylist()
+        elif pa.types.is_floating(arreglo.type) or pa.types.is_integer(arreglo.type):
+            columnas[nombre] = arreglo.to_numpy(zero_copy_only=True)
+        else:
+            columnas[nombre] = arreglo.to_numpy(zero_copy_only=False)
+    return columnas
+
+
+def _validar_columnas(crudas: Dict[str, object]) -> Dict[str, np.ndarray]:
+    """
+    Valida de forma vectorizada las columnas con las mismas reglas que `DatosEstudiante`
+    y rellena los campos opcionales ausentes
+
+    Returns:
+        Diccionario campo -> array numpy listo para calcular las features
+    """
+    longitudes = {len(valores) for valores in crudas.values()}
+    if len(longitudes) > 1:
+        raise ValueError("Todas las columnas deben tener la misma longitud")
+    n = longitudes.pop() if longitudes else 0
+    if n == 0:
+        raise ValueError("No se proporcionaron estudiantes")
+
+    columnas = {}
+    for campo, valores_validos in CAMPOS_CATEGORICOS.items():
+        if campo not in crudas:
+            raise ValueError(f"Falta el campo obligatorio '{campo}'")
+        valores = np.asarray(crudas[campo], dtype=object)
+        if any(v is None for v in valores):
+            raise ValueError(f"El campo '{campo}' no admite valores nulos")
+        valores = np.char.upper(valores.astype(str))
+        invalidos = ~np.isin(valores, valores_validos)
+        if invalidos.any():
+            fila = int(np.argmax(invalidos))
+            raise ValueError(f"Estudiante {fila + 1}: {campo} debe ser uno de: {valores_validos}")
+        columnas[campo] = valores
+
+    for campo, r in RESTRICCIONES_CAMPOS.items():
+        if campo not in crudas:
+            if r["requerido"]:
+                raise ValueError(f"Falta el campo obligatorio '{campo}'")
+            columnas[campo] = np.full(n, r["default"], dtype=np.float64)
+            continue
+
+        valores = crudas[campo]
+        if not isinstance(valores, np.ndarray) or valores.dtype == object:
+            nulos = [v is None for v in valores]
+            if any(nulos):
+                if r["requerido"]:
+                    raise ValueError(f"El campo '{campo}' no admite valores nulos")
+                valores = [r["default"] if nulo else v for v, nulo in zip(valores, nulos)]
+            try:
+                valores = np.asarray(valores, dtype=np.float64)
+            except (TypeError, ValueError):
+                raise ValueError(f"El campo '{campo}' debe ser numérico")
+        elif valores.dtype != np.float64:
+            valores = valores.astype(np.float64)
+
+        fuera_de_rango = ~np.isfinite(valores)
+        if r["minimo"] is not None:
+            fuera_de_rango |= valores < r["minimo"]
+        if r["maximo"] is not None:
+            fuera_de_rango |= valores > r["maximo"]
+        if r["entero"]:
+            fuera_de_rango |= valores != np.round(valores)
+        if fuera_de_rango.any():
+            fila = int(np.argmax(fuera_de_rango))
+            raise ValueError(
+                f"Estudiante {fila + 1}: valor inválido para '{campo}' "
+                f"(mínimo {r['minimo']}, máximo {r['maximo']}{', entero' if r['entero'] else ''})"
+            )
+        columnas[campo] = valores
+
+    return columnas
+
+
+def leer_columnas(cuerpo: bytes, mimetype: str) -> Dict[str, np.ndarray]:
+    """
+    Decodifica y valida un lote de estudiantes en formato columnar
+
+    Args:
+        cuerpo: Bytes del cuerpo de la petición
+        mimetype: Content-Type de la petición
+
+    Returns:
+        Diccionario campo -> array numpy con los datos validados
+    """
+    formato = normalizar_mime(mimetype)
+    if formato == MIME_ARROW:
+        crudas = _columnas_desde_arrow(cuerpo)
+    elif formato == MIME_MSGPACK:
+        if msgpack is None:
+            raise FormatoNoSoportado("Formato MessagePack no disponible: instala 'msgpack'")
+        try:
+            datos = msgpack.unpackb(cuerpo, raw=False)
+        except Exception as e:
+            raise ValueError(f"Cuerpo MessagePack inválido: {type(e).__name__}: {e}")
+        crudas = _columnas_desde_mapa(datos)
+    elif formato == MIME_JSON:
+        crudas = _columnas_desde_mapa(json.loads(cuerpo))
+    else:
+        raise FormatoNoSoportado(f"Content-Type no soportado: {mimetype}")
+
+    return _validar_columnas(crudas)
+
+
+def serializar_resultados(resultados: Dict[str, np.ndarray], mimetype: str) -> Tuple[bytes, str]:
+    """
+    Serializa las predicciones de un lote como arrays columnares
+
+    Args:
+        resultados: Salida de `PredictorRutas.predecir_columnas`
+        mimetype: Formato de respuesta negociado
+
+    Returns:
+        Tupla con (bytes, mimetype)
+    """
+    formato = normalizar_mime(mimetype)
+    total = len(resultados["ruta_recomendada_id"])
+
+    if formato == MIME_ARROW:
+        if pa is None:
+            raise FormatoNoSoportado("Formato Arrow no disponible: instala 'pyarrow'")
+        k = resultados["top_rutas"].shape[1]
+        tabla = pa.table({
+            "ruta_recomendada_id": pa.array(resultados["ruta_recomendada_id"]),
+            "confidence": pa.array(resultados["confidence"]),
+            "top_rutas": pa.FixedSizeListArray.from_arrays(
+                pa.array(resultados["top_rutas"].ravel()), k
+            ),
+            "top_probabilidades": pa.FixedSizeListArray.from_arrays(
+                pa.array(resultados["top_probabilidades"].ravel()), k
+            ),
+            **{
+                campo: pa.array(resultados[campo])
+                for campo in CAMPOS_OPCIONALES_RESULTADO if campo in resultados
+            }
+        })
+        sink = io.BytesIO()
+        with pa.ipc.new_stream(sink, tabla.schema) as writer:
+            writer.write_table(tabla)
+        return sink.getvalue(), MIME_ARROW
+
+    cuerpo = {
+        "success": True,
+        "total": total,
+        "ruta_recomendada_id": resultados["ruta_recomendada_id"].tolist(),
+        "confidence": resultados["confidence"].tolist(),
+        "top_rutas": resultados["top_rutas"].tolist(),
+        "top_probabilidades": resultados["top_probabilidades"].tolist()
+    }
+    for campo in CAMPOS_OPCIONALES_RESULTADO:
+        if campo in resultados:
+            cuerpo[campo] = resultados[campo].tolist()
+
+    if formato == MIME_MSGPACK:
+        if msgpack is None:
+            raise FormatoNoSoportado("Formato MessagePack no disponible: instala 'msgpack'")
+        return msgpack.packb(cuerpo, use_bin_type=True), MIME_MSGPACK
+
+    return json.dumps(cuerpo).encode("utf-8"), MIME_JSON
@@ -0,0 +1,374 @@
+"""
+Jobs asíncronos de predicción batch con resultados en disco y reanudación por checkpoints
+"""
+import os
+import re
+import json
+import time
+import uuid
+import shutil
+import threading
+import numpy as np
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+from datetime import datetime, timedelta
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+ESTADO_PENDIENTE = "pendiente"
+ESTADO_EN_PROGRESO = "en_progreso"
+ESTADO_COMPLETADO = "completado"
+ESTADO_ERROR = "error"
+
+# Los ids de job son uuid4 en hexadecimal; cualquier otro valor se trata como inexistente
+PATRON_JOB_ID = re.compile(r"^[0-9a-f]{32}$")
+
+# Intervalo entre intentos de ocupar un slot cuando todos están tomados
+ESPERA_SLOT_S = 1.0
+
+
+def _escribir_atomico(ruta: Path, escribir):
+    """Escribe un archivo en un temporal y lo renombra para no dejar archivos a medias"""
+    temporal = ruta.with_name(ruta.name + ".tmp")
+    with open(temporal, 'wb') as f:
+        escribir(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporal, ruta)
+
+
+class GestorJobs:
+    """Ejecuta jobs de predicción en un pool local, por chunks y con checkpoints en disco"""
+
+    def __init__(self, predictor, jobs_dir: str = "jobs", max_workers: int = 1,
+                 tamano_chunk: int = 1000, espera_interactiva_s: float = 1.0,
+                 max_reintentos: int = 3, ttl_horas: float = 24.0):
+        """
+        Inicializa el gestor y reanuda los jobs que quedaron sin terminar
+
+        Args:
+            predictor: Instancia de PredictorRutas ya cargada
+            jobs_dir: Directorio donde se guardan entradas, estado y resultados
+            max_workers: Número máximo de jobs ejecutándose a la vez, entre todos los
+                procesos que comparten `jobs_dir`
+            tamano_chunk: Estudiantes por chunk (cada chunk es un checkpoint)
+            espera_interactiva_s: Tiempo máximo que un chunk cede ante peticiones interactivas
+            max_reintentos: Veces que un job con error se reanuda automáticamente al iniciar
+            ttl_horas: Horas que se conservan los jobs terminados (0 los conserva siempre)
+        """
+        self.predictor = predictor
+        self.jobs_dir = Path(jobs_dir)
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        self.tamano_chunk = max(int(tamano_chunk), 1)
+        self.espera_interactiva_s = espera_interactiva_s
+        self.max_reintentos = max(int(max_reintentos), 0)
+        self.ttl_horas = max(float(ttl_horas), 0.0)
+
+        self.max_workers = max(int(max_workers), 1)
+
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        self._lock_estado = threading.Lock()
+        self._interactivas = 0
+        self._condicion = threading.Condition()
+
+        self.limpiar_expirados()
+        self._reanudar_pendientes()
+
+    @contextmanager
+    def prioridad_interactiva(self):
+        """
+        Marca una petición interactiva en curso; los jobs de este proceso esperan a que
+        termine antes del siguiente chunk (no se coordina con otros procesos)
+        """
+        with self._condicion:
+            self._interactivas += 1
+        try:
+            yield
+        finally:
+            with self._condicion:
+                self._interactivas -= 1
+                self._condicion.notify_all()
+
+    def _ceder_a_interactivas(self):
+        """Espera (con límite) a que no haya peticiones interactivas en curso"""
+        limite = time.monotonic() + self.espera_interactiva_s
+        with self._condicion:
+            while self._interactivas > 0:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    break
+                self._condicion.wait(restante)
+
+    @contextmanager
+    def _ocupar_slot(self):
+        """
+        Ocupa uno de los `max_workers` slots (archivos `slot_<i>.lock` en `jobs_dir`),
+        esperando a que se libere alguno si todos están tomados por este u otros procesos
+        """
+        if fcntl is None:
+            yield
+            return
+
+        while True:
+            for indice in range(self.max_workers):
+                archivo_slot = open(self.jobs_dir / f"slot_{indice}.lock", 'w')
+                try:
+                    fcntl.flock(archivo_slot, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    archivo_slot.close()
+                    continue
+                try:
+                    yield
+                finally:
+                    archivo_slot.close()
+                return
+            time.sleep(ESPERA_SLOT_S)
+
+    def _dir_job(self, job_id: str) -> Path:
+        return self.jobs_dir / job_id
+
+    def _leer_estado(self, job_id: str) -> Optional[dict]:
+        if not PATRON_JOB_ID.match(job_id):
+            return None
+        ruta = self._dir_job(job_id) / "estado.json"
+        if not ruta.exists():
+            return None
+        with open(ruta, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _guardar_estado(self, estado: dict):
+        estado["actualizado"] = datetime.now().isoformat()
+        contenido = json.dumps(estado).encode('utf-8')
+        with self._lock_estado:
+            _escribir_atomico(self._dir_job(estado["id"]) / "estado.json", lambda f: f.write(contenido))
+
+    def crear_job(self, columnas: Dict[str, np.ndarray]) -> dict:
+        """
+        Guarda un lote ya validado en disco y lo encola
+
+        Args:
+            columnas: Diccionario campo -> array (salida de `leer_columnas`)
+
+        Returns:
+            Estado inicial del job
+        """
+        self.limpiar_expirados()
+
+        job_id = uuid.uuid4().hex
+        dir_job = self._dir_job(job_id)
+        dir_job.mkdir(parents=True)
+
+        total = len(columnas['porcentaje_diagnostico_inicial'])
+        _escribir_atomico(dir_job / "entrada.npz", lambda f: np.savez(f, **columnas))
+
+        estado = {
+            "id": job_id,
+            "estado": ESTADO_PENDIENTE,
+            "total": total,
+            "tamano_chunk": self.tamano_chunk,
+            "chunks_total": (total + self.tamano_chunk - 1) // self.tamano_chunk,
+            "chunks_completados": 0,
+            "creado": datetime.now().isoformat(),
+            "error": None,
+            "reintentos": 0
+        }
+        self._guardar_estado(estado)
+        self._executor.submit(self._ejecutar_job, job_id)
+        return self.obtener_estado(job_id)
+
+    def obtener_estado(self, job_id: str) -> Optional[dict]:
+        """
+        Obtiene el estado y el progreso de un job
+
+        Returns:
+            Diccionario con el estado o None si el job no existe
+        """
+        estado = self._leer_estado(job_id)
+        if estado is None:
+            return None
+        estado["progreso"] = (
+            estado["chunks_completados"] / estado["chunks_total"] if estado["chunks_total"] else 1.0
+        )
+        return estado
+
+    def _ruta_chunk(self, job_id: str, indice: int) -> Path:
+        return self._dir_job(job_id) / f"resultado_{indice:06d}.npz"
+
+    def _ejecutar_job(self, job_id: str):
+        """Procesa los chunks pendientes de un job; los ya escritos en disco se saltan"""
+        dir_job = self._dir_job(job_id)
+        archivo_lock = None
+        try:
+            # Evita que otro proceso (p. ej. otra instancia de Passenger) procese el mismo job
+            if fcntl is not None:
+                archivo_lock = open(dir_job / "job.lock", 'w')
+                try:
+                    fcntl.flock(archivo_lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    return
+
+            estado = self._leer_estado(job_id)
+            if estado is None or estado["estado"] in (ESTADO_COMPLETADO, ESTADO_ERROR):
+                return
+
+            # El límite de jobs simultáneos se aplica entre todos los procesos del mismo JOBS_DIR
+            with self._ocupar_slot():
+                estado["estado"] = ESTADO_EN_PROGRESO
+                self._guardar_estado(estado)
+
+                with np.load(dir_job / "entrada.npz", allow_pickle=False) as datos:
+                    columnas = {campo: datos[campo] for campo in datos.files}
+
+                tamano = estado["tamano_chunk"]
+                for indice in range(estado["chunks_total"]):
+                    ruta_chunk = self._ruta_chunk(job_id, indice)
+                    if ruta_chunk.exists():
+                        continue
+
+                    self._ceder_a_interactivas()
+
+                    inicio = indice * tamano
+                    fin = min(inicio + tamano, estado["total"])
+                    resultados = self.predictor.predecir_columnas(
+                        {campo: valores[inicio:fin] for campo, valores in columnas.items()}
+                    )
+                    _escribir_atomico(ruta_chunk, lambda f: np.savez(f, inicio=inicio, **resultados))
+
+                    estado["chunks_completados"] = sum(
+                        1 for i in range(estado["chunks_total"]) if self._ruta_chunk(job_id, i).exists()
+                    )
+                    self._guardar_estado(estado)
+
+                estado["estado"] = ESTADO_COMPLETADO
+                self._guardar_estado(estado)
+
+        except Exception as e:
+            estado = self._leer_estado(job_id)
+            if estado is not None:
+                estado["estado"] = ESTADO_ERROR
+                estado["error"] = str(e)
+                estado["reintentos"] = estado.get("reintentos", 0) + 1
+                self._guardar_estado(estado)
+        finally:
+            if archivo_lock is not None:
+                archivo_lock.close()
+
+    def reintentar_job(self, job_id: str) -> Optional[dict]:
+        """
+        Vuelve a encolar un job con error; continúa desde el primer chunk que falte en disco
+
+        Returns:
+            Estado del job o None si no existe
+        """
+        estado = self._leer_estado(job_id)
+        if estado is None:
+            return None
+        if estado["estado"] != ESTADO_ERROR:
+            raise ValueError(f"Solo se pueden reintentar jobs en estado '{ESTADO_ERROR}' (estado actual: '{estado['estado']}')")
+
+        estado["estado"] = ESTADO_PENDIENTE
+        estado["error"] = None
+        self._guardar_estado(estado)
+        self._executor.submit(self._ejecutar_job, job_id)
+        return self.obtener_estado(job_id)
+
+    def eliminar_job(self, job_id: str) -> bool:
+        """
+        Borra un job y sus resultados del disco
+
+        Returns:
+            True si se borró, False si no existe
+
+        Raises:
+            ValueError: Si el job se está ejecutando en este u otro proceso
+        """
+        if self._leer_estado(job_id) is None:
+            return False
+
+        dir_job = self._dir_job(job_id)
+        if fcntl is None:
+            shutil.rmtree(dir_job, ignore_errors=True)
+            return True
+
+        # Con el lock del job tomado ningún worker puede empezar a procesarlo mientras se borra
+        with open(dir_job / "job.lock", 'w') as archivo_lock:
+            try:
+                fcntl.flock(archivo_lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                raise ValueError(f"El job {job_id} se está ejecutando y no se puede eliminar")
+            shutil.rmtree(dir_job, ignore_errors=True)
+        return True
+
+    def limpiar_expirados(self):
+        """Borra los jobs completados o con error cuya última actualización supera el TTL"""
+        if not self.ttl_horas:
+            return
+
+        limite = datetime.now() - timedelta(hours=self.ttl_horas)
+        for dir_job in self.jobs_dir.iterdir():
+            if not dir_job.is_dir():
+                continue
+            try:
+                estado = self._leer_estado(dir_job.name)
+                if estado is None or estado["estado"] not in (ESTADO_COMPLETADO, ESTADO_ERROR):
+                    continue
+                if datetime.fromisoformat(estado["actualizado"]) < limite:
+                    self.eliminar_job(dir_job.name)
+            except Exception as e:
+                print(f"Advertencia: No se pudo limpiar el job {dir_job.name}: {str(e)}")
+
+    def _reanudar_pendientes(self):
+        """
+        Vuelve a encolar los jobs que quedaron pendientes o interrumpidos, y los
+        jobs con error que aún no agotaron sus reintentos automáticos
+        """
+        for dir_job in sorted(self.jobs_dir.iterdir()):
+            if not dir_job.is_dir():
+                continue
+            try:
+                estado = self._leer_estado(dir_job.name)
+            except Exception as e:
+                print(f"Advertencia: No se pudo leer el estado del job {dir_job.name}: {str(e)}")
+                continue
+            if estado is None:
+                continue
+            if estado["estado"] == ESTADO_ERROR and estado.get("reintentos", 0) < self.max_reintentos:
+                estado["estado"] = ESTADO_PENDIENTE
+                self._guardar_estado(estado)
+            if estado["estado"] in (ESTADO_PENDIENTE, ESTADO_EN_PROGRESO):
+                self._executor.submit(self._ejecutar_job, dir_job.name)
+
+    def iterar_resultados(self, job_id: str, desde_chunk: int = 0) -> Iterator[dict]:
+        """
+        Recorre en orden los chunks ya terminados, deteniéndose en el primero que falte
+
+        Args:
+            job_id: Identificador del job
+            desde_chunk: Primer chunk a devolver
+
+        Yields:
+            Diccionario columnar por chunk
+        """
+        estado = self._leer_estado(job_id)
+        if estado is None:
+            return
+
+        for indice in range(max(desde_chunk, 0), estado["chunks_total"]):
+            ruta_chunk = self._ruta_chunk(job_id, indice)
+            if not ruta_chunk.exists():
+                return
+            with np.load(ruta_chunk, allow_pickle=False) as datos:
+                yield {
+                    "chunk": indice,
+                    "inicio": int(datos["inicio"]),
+                    "ruta_recomendada_id": datos["ruta_recomendada_id"].tolist(),
+                    "confidence": datos["confidence"].tolist(),
+                    "top_rutas": datos["top_rutas"].tolist(),
+                    "top_probabilidades": datos["top_probabilidades"].tolist()
+                }
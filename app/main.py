@@ -1,18 +1,34 @@
 """
 API principal de Recomendación de Rutas de Aprendizaje
 """
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response
+import json
 from app.models import (
     DatosEstudiante, 
     ResponseModel, 
     PrediccionResponse,
     BatchRequest,
-    BatchResponse
+    BatchResponse,
+    EvaluacionBosque
 )
 from app.predictor import PredictorRutas
 from app.utils import obtener_nombre_ruta
+from app.formatos import (
+    FORMATOS_SOPORTADOS,
+    FORMATOS_DISPONIBLES,
+    MIME_JSON,
+    FormatoNoSoportado,
+    es_formato_binario,
+    normalizar_mime,
+    leer_columnas,
+    serializar_resultados,
+    mime_por_extension
+)
+from app.jobs import GestorJobs
 from pydantic import ValidationError
 import os
+import math
+from contextlib import nullcontext
 
 # Inicializar Flask
 app = Flask(__name__)
@@ -29,6 +45,48 @@ except Exception as e:
     print(f"Advertencia: No se pudo cargar el modelo al iniciar: {str(e)}")
     predictor = None
 
+# Gestor de jobs asíncronos (reanuda los jobs interrumpidos al iniciar)
+gestor_jobs = None
+if predictor is not None:
+    try:
+        gestor_jobs = GestorJobs(
+            predictor,
+            jobs_dir=os.getenv("JOBS_DIR", "jobs"),
+            max_workers=int(os.getenv("JOBS_MAX_WORKERS", "1")),
+            tamano_chunk=int(os.getenv("JOBS_CHUNK_SIZE", "1000")),
+            max_reintentos=int(os.getenv("JOBS_MAX_RETRIES", "3")),
+            ttl_horas=float(os.getenv("JOBS_TTL_HORAS", "24"))
+        )
+    except Exception as e:
+        print(f"Advertencia: No se pudo iniciar el gestor de jobs: {str(e)}")
+        gestor_jobs = None
+
+
+def _prioridad_interactiva():
+    """Contexto que hace que los jobs cedan ante las peticiones interactivas"""
+    if gestor_jobs is None:
+        return nullcontext()
+    return gestor_jobs.prioridad_interactiva()
+
+
+def _parametros_anticipado():
+    """
+    Lee los parámetros de votación anticipada de la query string
+    
+    Returns:
+        Tupla con (anticipado, presupuesto_ms)
+    """
+    presupuesto = request.args.get("presupuesto_ms")
+    anticipado = request.args.get("anticipado", "false").lower() in ("1", "true", "si", "sí")
+    if presupuesto is None:
+        return anticipado, None
+    
+    presupuesto_ms = float(presupuesto)
+    if not math.isfinite(presupuesto_ms) or presupuesto_ms <= 0:
+        raise ValueError("presupuesto_ms debe ser un número finito mayor que 0")
+    # Un presupuesto de latencia implica la votación anticipada
+    return True, presupuesto_ms
+
 
 @app.route("/", methods=["GET"])
 def root():
@@ -43,9 +101,14 @@ def root():
             "/": "Información de la API",
             "/ping": "Endpoint de prueba",
             "/health": "Estado de salud de la API",
-            "/predict": "POST - Predecir ruta para un estudiante",
-            "/predict/batch": "POST - Predecir rutas para múltiples estudiantes",
-            "/model/info": "GET - Información del modelo"
+            "/predict": "POST - Predecir ruta para un estudiante (?anticipado=true&presupuesto_ms= para parada anticipada)",
+            "/predict/batch": "POST - Predecir rutas para múltiples estudiantes (JSON, MessagePack o Arrow IPC)",
+            "/model/info": "GET - Información del modelo",
+            "/model/drift": "GET - Drift de las entradas y rutas predichas (POST /model/drift/baseline fija la línea base)",
+            "/jobs": "POST - Crear un job asíncrono de predicción batch",
+            "/jobs/{id}": "GET - Estado y progreso de un job (DELETE lo elimina)",
+            "/jobs/{id}/results": "GET - Resultados de los chunks terminados (NDJSON)",
+            "/jobs/{id}/retry": "POST - Reintentar un job con error desde el último checkpoint"
         }
     })
 
@@ -91,6 +154,45 @@ def model_info():
     return jsonify(info)
 
 
+@app.route("/model/drift", methods=["GET"])
+def model_drift():
+    """
+    Obtiene los puntajes de drift de las features de entrada y de las rutas predichas
+    """
+    if predictor is None or not predictor.cargado:
+        return jsonify({
+            "error": "Modelo no disponible. Verifica que los archivos del modelo estén en la carpeta 'modelos/'"
+        }), 503
+    
+    return jsonify(predictor.obtener_drift())
+
+
+@app.route("/model/drift/baseline", methods=["POST"])
+def model_drift_baseline():
+    """
+    Fija las distribuciones observadas hasta ahora como línea base de drift
+    """
+    if predictor is None or not predictor.cargado:
+        return jsonify({
+            "success": False,
+            "error": "Modelo no disponible. Verifica que los archivos del modelo estén en la carpeta 'modelos/'"
+        }), 503
+    
+    try:
+        baseline = predictor.fijar_baseline_drift()
+        return jsonify({"success": True, "baseline": baseline})
+    except ValueError as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": f"Error al fijar la línea base: {str(e)}"
+        }), 500
+
+
 @app.route("/predict", methods=["POST"])
 def predecir_ruta():
     """
@@ -115,12 +217,20 @@ def predecir_ruta():
             }), 400
         
         estudiante = DatosEstudiante(**datos_json)
+        anticipado, presupuesto_ms = _parametros_anticipado()
         
         # Convertir modelo Pydantic a diccionario
         datos_estudiante = estudiante.dict()
         
         # Realizar predicción
-        ruta_id, confidence, probabilidades = predictor.predecir(datos_estudiante)
+        evaluacion = None
+        with _prioridad_interactiva():
+            if anticipado:
+                ruta_id, confidence, probabilidades, evaluacion = predictor.predecir_anticipado(
+                    datos_estudiante, presupuesto_ms
+                )
+            else:
+                ruta_id, confidence, probabilidades = predictor.predecir(datos_estudiante)
         
         # Obtener nombre de la ruta
         ruta_nombre = obtener_nombre_ruta(ruta_id)
@@ -137,7 +247,8 @@ def predecir_ruta():
             ruta_recomendada_nombre=ruta_nombre,
             confidence=confidence,
             probabilidades=probabilidades,
-            mensaje=mensaje
+            mensaje=mensaje,
+            evaluacion=EvaluacionBosque(**evaluacion) if evaluacion else None
         )
         
         return jsonify(ResponseModel(
@@ -146,7 +257,7 @@ def predecir_ruta():
             error=None
         ).dict())
         
-    except ValidationError as e:
+    except (ValidationError, ValueError) as e:
         return jsonify({
             "success": False,
             "error": f"Error de validación: {str(e)}"
@@ -172,6 +283,25 @@ def predecir_rutas_batch():
             "error": "Modelo no disponible. Verifica que los archivos del modelo estén en la carpeta 'modelos/'"
         }), 503
     
+    if normalizar_mime(request.mimetype) not in FORMATOS_SOPORTADOS:
+        return jsonify({
+            "success": False,
+            "error": f"Content-Type no soportado: {request.mimetype}"
+        }), 415
+    
+    # Sin cabecera Accept se responde JSON; si ninguna opción aceptable está instalada, 406
+    formato_respuesta = MIME_JSON
+    if request.accept_mimetypes:
+        formato_respuesta = request.accept_mimetypes.best_match(FORMATOS_DISPONIBLES)
+        if formato_respuesta is None:
+            return jsonify({
+                "success": False,
+                "error": f"Ningún formato aceptable disponible; formatos disponibles: {FORMATOS_DISPONIBLES}"
+            }), 406
+    
+    if es_formato_binario(request.mimetype) or es_formato_binario(formato_respuesta):
+        return _predecir_batch_columnar(formato_respuesta)
+    
     try:
         # Validar datos de entrada con Pydantic
         datos_json = request.get_json()
@@ -182,12 +312,17 @@ def predecir_rutas_batch():
             }), 400
         
         batch_request = BatchRequest(**datos_json)
+        anticipado, presupuesto_ms = _parametros_anticipado()
         
         # Convertir lista de modelos Pydantic a diccionarios
         lista_datos = [estudiante.dict() for estudiante in batch_request.estudiantes]
         
         # Realizar predicciones
-        resultados = predictor.predecir_batch(lista_datos)
+        with _prioridad_interactiva():
+            if anticipado:
+                resultados = predictor.predecir_batch_anticipado(lista_datos, presupuesto_ms)
+            else:
+                resultados = predictor.predecir_batch(lista_datos)
         
         # Formatear respuestas
         predicciones = []
@@ -204,7 +339,8 @@ def predecir_rutas_batch():
                     )
                 )
             else:
-                ruta_id, confidence, probabilidades = resultado
+                ruta_id, confidence, probabilidades = resultado[:3]
+                evaluacion = resultado[3] if len(resultado) > 3 else None
                 ruta_nombre = obtener_nombre_ruta(ruta_id)
                 
                 predicciones.append(
@@ -212,7 +348,8 @@ def predecir_rutas_batch():
                         ruta_recomendada_id=ruta_id,
                         ruta_recomendada_nombre=ruta_nombre,
                         confidence=confidence,
-                        probabilidades=probabilidades
+                        probabilidades=probabilidades,
+                        evaluacion=EvaluacionBosque(**evaluacion) if evaluacion else None
                     )
                 )
         
@@ -222,7 +359,7 @@ def predecir_rutas_batch():
             predicciones=predicciones
         ).dict())
         
-    except ValidationError as e:
+    except (ValidationError, ValueError) as e:
         return jsonify({
             "success": False,
             "error": f"Error de validación: {str(e)}"
@@ -234,5 +371,195 @@ def predecir_rutas_batch():
         }), 500
 
 
+def _predecir_batch_columnar(formato_respuesta: str):
+    """
+    Atiende /predict/batch cuando la petición o la respuesta usan MessagePack o Arrow.
+    La validación y la predicción se hacen de forma vectorizada sobre columnas y la
+    respuesta contiene arrays columnares en lugar de objetos por estudiante.
+    """
+    try:
+        top_k = int(request.args.get("top_k", 3))
+        anticipado, presupuesto_ms = _parametros_anticipado()
+        columnas = leer_columnas(request.get_data(), request.mimetype)
+        with _prioridad_interactiva():
+            resultados = predictor.predecir_columnas(
+                columnas, top_k=top_k, anticipado=anticipado, presupuesto_ms=presupuesto_ms
+            )
+        cuerpo, mimetype = serializar_resultados(resultados, formato_respuesta)
+        return Response(cuerpo, mimetype=mimetype)
+        
+    except FormatoNoSoportado as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 415
+    except ValueError as e:
+        return jsonify({
+            "success": False,
+            "error": f"Error de validación: {str(e)}"
+        }), 400
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": f"Error al realizar las predicciones: {str(e)}"
+        }), 500
+
+
+@app.route("/jobs", methods=["POST"])
+def crear_job():
+    """
+    Crea un job asíncrono para un lote grande de estudiantes.
+    Acepta el mismo cuerpo que /predict/batch (JSON, MessagePack o Arrow)
+    o un archivo multipart en el campo 'archivo'.
+    
+    Returns:
+        Estado inicial del job (202)
+    """
+    if gestor_jobs is None:
+        return jsonify({
+            "success": False,
+            "error": "Servicio de jobs no disponible"
+        }), 503
+    
+    try:
+        if "archivo" in request.files:
+            archivo = request.files["archivo"]
+            mimetype = archivo.mimetype
+            if not mimetype or mimetype == "application/octet-stream":
+                mimetype = mime_por_extension(archivo.filename)
+            columnas = leer_columnas(archivo.read(), mimetype)
+        else:
+            columnas = leer_columnas(request.get_data(), request.mimetype)
+        
+        estado = gestor_jobs.crear_job(columnas)
+        return jsonify({"success": True, "job": estado}), 202, {"Location": f"/jobs/{estado['id']}"}
+        
+    except FormatoNoSoportado as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 415
+    except ValueError as e:
+        return jsonify({
+            "success": False,
+            "error": f"Error de validación: {str(e)}"
+        }), 400
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": f"Error al crear el job: {str(e)}"
+        }), 500
+
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def estado_job(job_id):
+    """
+    Obtiene el estado y el progreso de un job
+    """
+    if gestor_jobs is None:
+        return jsonify({
+            "success": False,
+            "error": "Servicio de jobs no disponible"
+        }), 503
+    
+    estado = gestor_jobs.obtener_estado(job_id)
+    if estado is None:
+        return jsonify({
+            "success": False,
+            "error": f"Job {job_id} no encontrado"
+        }), 404
+    
+    return jsonify({"success": True, "job": estado})
+
+
+@app.route("/jobs/<job_id>", methods=["DELETE"])
+def eliminar_job(job_id):
+    """
+    Elimina un job que no se esté ejecutando, junto con sus resultados
+    """
+    if gestor_jobs is None:
+        return jsonify({
+            "success": False,
+            "error": "Servicio de jobs no disponible"
+        }), 503
+    
+    try:
+        eliminado = gestor_jobs.eliminar_job(job_id)
+    except ValueError as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 409
+    
+    if not eliminado:
+        return jsonify({
+            "success": False,
+            "error": f"Job {job_id} no encontrado"
+        }), 404
+    
+    return jsonify({"success": True})
+
+
+@app.route("/jobs/<job_id>/retry", methods=["POST"])
+def reintentar_job(job_id):
+    """
+    Reintenta un job con error; los chunks ya terminados no se recalculan
+    """
+    if gestor_jobs is None:
+        return jsonify({
+            "success": False,
+            "error": "Servicio de jobs no disponible"
+        }), 503
+    
+    try:
+        estado = gestor_jobs.reintentar_job(job_id)
+    except ValueError as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 409
+    
+    if estado is None:
+        return jsonify({
+            "success": False,
+            "error": f"Job {job_id} no encontrado"
+        }), 404
+    
+    return jsonify({"success": True, "job": estado}), 202
+
+
+@app.route("/jobs/<job_id>/results", methods=["GET"])
+def resultados_job(job_id):
+    """
+    Devuelve como NDJSON (un objeto columnar por línea) los chunks ya terminados de un job.
+    El parámetro ?desde=N permite continuar a partir del chunk N.
+    """
+    if gestor_jobs is None:
+        return jsonify({
+            "success": False,
+            "error": "Servicio de jobs no disponible"
+        }), 503
+    
+    if gestor_jobs.obtener_estado(job_id) is None:
+        return jsonify({
+            "success": False,
+            "error": f"Job {job_id} no encontrado"
+        }), 404
+    
+    try:
+        desde = int(request.args.get("desde", 0))
+    except ValueError:
+        return jsonify({
+            "success": False,
+            "error": "El parámetro 'desde' debe ser un entero"
+        }), 400
+    
+    def generar():
+        for chunk in gestor_jobs.iterar_resultados(job_id, desde_chunk=desde):
+            yield json.dumps(chunk) + "\n"
+    
+    return Response(generar(), mimetype="application/x-ndjson")
+
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=8000, debug=True)
@@ -163,6 +163,15 @@ class DatosEstudiante(BaseModel):
         }
 
 
+class EvaluacionBosque(BaseModel):
+    """Detalle de la votación del bosque cuando se usa parada anticipada"""
+    arboles_usados: int
+    arboles_totales: int
+    ruta_exacta: bool
+    probabilidades_exactas: bool
+    motivo_parada: Optional[str] = None
+
+
 class PrediccionResponse(BaseModel):
     """Modelo para la respuesta de una predicción"""
     ruta_recomendada_id: int
@@ -170,6 +179,7 @@ class PrediccionResponse(BaseModel):
     confidence: float
     probabilidades: Optional[Dict[str, float]] = None
     mensaje: Optional[str] = None
+    evaluacion: Optional[EvaluacionBosque] = None
 
 
 class ResponseModel(BaseModel):
@@ -3,12 +3,15 @@ Clase para cargar y usar el modelo de recomendación de rutas
 """
 import os
 import json
+import time
 import pickle
+import threading
 import pandas as pd
 import numpy as np
 from pathlib import Path
-from typing import Optional, Dict, Tuple
+from typing import Optional, Dict, Tuple, List
 from datetime import datetime
+from app.drift import MonitorDrift
 
 
 class PredictorRutas:
@@ -26,6 +29,10 @@ class PredictorRutas:
         self.scaler = None
         self.metadata = None
         self.features = None
+        self.monitor_drift = None
+        self.archivo_metadata = None
+        self.destilado = None
+        self.umbral_destilado = None
         self.cargado = False
         
         self._cargar_modelo()
@@ -60,13 +67,91 @@ class PredictorRutas:
             with open(archivo_metadata, 'r', encoding='utf-8') as f:
                 self.metadata = json.load(f)
             
+            self.archivo_metadata = archivo_metadata
             self.features = self.metadata.get('features', [])
+            
+            # Sketches de drift sobre las features escaladas y las rutas predichas
+            self.monitor_drift = MonitorDrift(
+                features=self.features,
+                clases=self.modelo.classes_,
+                tamano_buffer=int(os.getenv("DRIFT_BUFFER_SIZE", "256")),
+                archivo_baseline=self.modelos_dir / "drift_baseline.json",
+                min_observaciones=int(os.getenv("DRIFT_MIN_OBSERVACIONES", "500"))
+            )
+            
+            self._cargar_destilado()
+            
             self.cargado = True
             
         except Exception as e:
             self.cargado = False
             raise Exception(f"Error al cargar el modelo: {str(e)}")
     
+    def _cargar_destilado(self):
+        """Carga el modelo rápido destilado si existe (opcional, no impide cargar el bosque)"""
+        self._lock_niveles = threading.Lock()
+        self.estadisticas_niveles = {"rapido": 0, "bosque": 0}
+        
+        # Solo sirve el destilado generado a partir de este mismo modelo (mismo timestamp)
+        sufijo = self.archivo_metadata.stem.replace("metadata_", "", 1)
+        archivo_destilado = self.modelos_dir / f"destilado_{sufijo}.pkl"
+        if not archivo_destilado.exists() or os.getenv("FAST_TIER_ENABLED", "1") == "0":
+            return
+        
+        try:
+            with open(archivo_destilado, 'rb') as f:
+                destilado = pickle.load(f)
+            
+            if destilado.get("metadata_origen") != self.archivo_metadata.name:
+                print(
+                    f"Advertencia: El modelo destilado {archivo_destilado.name} se generó a partir de "
+                    f"{destilado.get('metadata_origen')} y no de {self.archivo_metadata.name}; se ignora"
+                )
+                return
+            
+            if destilado.get("features") != self.features:
+                print("Advertencia: El modelo destilado no corresponde a las features del modelo; se ignora")
+                return
+            
+            if destilado.get("clases") != self.modelo.classes_.tolist():
+                print("Advertencia: El modelo destilado no corresponde a las rutas del modelo; "
+                      "vuelve a generarlo con 'python -m app.destilado'")
+                return
+            
+            self.destilado = destilado["modelo"]
+            self.umbral_destilado = float(os.getenv("FAST_TIER_THRESHOLD", destilado["umbral"]))
+        except Exception as e:
+            print(f"Advertencia: No se pudo cargar el modelo destilado: {str(e)}")
+            self.destilado = None
+    
+    def _predecir_proba(self, features_scaled: np.ndarray) -> np.ndarray:
+        """
+        Calcula las probabilidades con el modelo rápido y escala al bosque
+        las filas cuya confianza queda por debajo del umbral
+        
+        Args:
+            features_scaled: Matriz (n, num_features) ya escalada
+            
+        Returns:
+            Matriz (n, num_clases) con las probabilidades sobre las clases del bosque
+        """
+        if self.destilado is None:
+            return self.modelo.predict_proba(features_scaled)
+        
+        # El árbol destilado predice directamente las probabilidades del bosque
+        probabilidades = np.array(self.destilado.predict(features_scaled), dtype=np.float64)
+        
+        escalar = probabilidades.max(axis=1) < self.umbral_destilado
+        if escalar.any():
+            probabilidades[escalar] = self.modelo.predict_proba(features_scaled[escalar])
+        
+        num_escaladas = int(escalar.sum())
+        with self._lock_niveles:
+            self.estadisticas_niveles["rapido"] += len(escalar) - num_escaladas
+            self.estadisticas_niveles["bosque"] += num_escaladas
+        
+        return probabilidades
+    
     def _preparar_features(self, datos: dict) -> np.ndarray:
         """
         Prepara las features para la predicción según el formato esperado
@@ -95,6 +180,29 @@ class PredictorRutas:
         
         return features_df.values
     
+    def _preparar_features_columnas(self, columnas: Dict[str, np.ndarray]) -> np.ndarray:
+        """
+        Prepara la matriz de features para un lote en formato columnar
+        
+        Args:
+            columnas: Diccionario campo -> array con los datos de los estudiantes
+            
+        Returns:
+            Array numpy (n, num_features) con las features en el orden del modelo
+        """
+        from app.utils import calcular_features_derivadas_columnas
+        
+        features_dict = calcular_features_derivadas_columnas(columnas)
+        n = len(columnas['porcentaje_diagnostico_inicial'])
+        
+        # Escribir cada feature directamente en su columna de la matriz
+        matriz = np.zeros((n, len(self.features)), dtype=np.float64)
+        for i, feature in enumerate(self.features):
+            if feature in features_dict:
+                matriz[:, i] = features_dict[feature]
+        
+        return matriz
+    
     def predecir(self, datos: dict) -> Tuple[int, float, Dict[str, float]]:
         """
         Realiza una predicción para un estudiante
@@ -115,9 +223,12 @@ class PredictorRutas:
             # Aplicar scaler
             features_scaled = self.scaler.transform(features_array)
             
-            # Realizar predicción
-            prediccion = self.modelo.predict(features_scaled)[0]
-            probabilidades = self.modelo.predict_proba(features_scaled)[0]
+            # Realizar predicción (modelo rápido con escalamiento al bosque si está disponible)
+            probabilidades = self._predecir_proba(features_scaled)[0]
+            prediccion = self.modelo.classes_[np.argmax(probabilidades)]
+            
+            # Registrar en los sketches de drift (se incorpora cada N filas)
+            self.monitor_drift.registrar(features_scaled, np.argmax(probabilidades))
             
             # Obtener confidence (probabilidad máxima)
             confidence = float(np.max(probabilidades))
@@ -155,6 +266,228 @@ class PredictorRutas:
                 resultados.append(None)
         return resultados
     
+    def _votar_anticipado(self, features_scaled: np.ndarray,
+                          presupuesto_ms: Optional[float] = None) -> Dict[str, np.ndarray]:
+        """
+        Evalúa los árboles del bosque por bloques y detiene cada fila en cuanto
+        la ruta líder ya no puede ser superada por los árboles restantes, o
+        todas las filas cuando se agota el presupuesto de latencia
+        
+        Args:
+            features_scaled: Matriz (n, num_features) ya escalada
+            presupuesto_ms: Tiempo máximo de votación en milisegundos (None = sin límite)
+            
+        Returns:
+            Diccionario con probabilidades (n, num_clases), arboles_usados (n,)
+            y motivo_parada (n,) con None, "voto_decidido" o "presupuesto"
+        """
+        n = features_scaled.shape[0]
+        clases = self.modelo.classes_
+        arboles = getattr(self.modelo, "estimators_", None)
+        
+        # Modelos que no son un bosque de árboles: evaluación completa
+        if not arboles:
+            return {
+                "probabilidades": self.modelo.predict_proba(features_scaled),
+                "arboles_usados": np.ones(n, dtype=np.int64),
+                "arboles_totales": 1,
+                "motivo_parada": np.full(n, None, dtype=object)
+            }
+        
+        inicio = time.perf_counter()
+        total_arboles = len(arboles)
+        tamano_bloque = max(int(os.getenv("EARLY_EXIT_BLOCK_SIZE", "10")), 1)
+        
+        # Los árboles del bosque esperan float32 (igual que RandomForestClassifier.predict_proba)
+        x = np.asarray(features_scaled, dtype=np.float32)
+        votos = np.zeros((n, len(clases)), dtype=np.float64)
+        arboles_usados = np.zeros(n, dtype=np.int64)
+        motivo_parada = np.full(n, None, dtype=object)
+        activas = np.arange(n)
+        
+        for desde in range(0, total_arboles, tamano_bloque):
+            bloque = arboles[desde:desde + tamano_bloque]
+            x_activas = x[activas]
+            for arbol in bloque:
+                votos[activas] += arbol.predict_proba(x_activas, check_input=False)
+            arboles_usados[activas] += len(bloque)
+            
+            restantes = total_arboles - (desde + len(bloque))
+            if restantes == 0:
+                break
+            
+            # Cada árbol aporta como máximo 1 a una clase: si la ventaja del líder
+            # supera los votos restantes, el argmax final ya no puede cambiar
+            dos_mayores = np.partition(votos[activas], -2, axis=1)[:, -2:]
+            decididas = (dos_mayores[:, 1] - dos_mayores[:, 0]) > restantes
+            motivo_parada[activas[decididas]] = "voto_decidido"
+            activas = activas[~decididas]
+            if activas.size == 0:
+                break
+            
+            if presupuesto_ms is not None and (time.perf_counter() - inicio) * 1000 >= presupuesto_ms:
+                motivo_parada[activas] = "presupuesto"
+                break
+        
+        return {
+            "probabilidades": votos / arboles_usados[:, None],
+            "arboles_usados": arboles_usados,
+            "arboles_totales": total_arboles,
+            "motivo_parada": motivo_parada
+        }
+    
+    def _resultados_anticipados(self, features_scaled: np.ndarray,
+                                presupuesto_ms: Optional[float] = None) -> List[tuple]:
+        """
+        Vota con parada anticipada y arma una tupla de resultado por fila
+        
+        Args:
+            features_scaled: Matriz (n, num_features) ya escalada
+            presupuesto_ms: Presupuesto de latencia de la votación en milisegundos
+            
+        Returns:
+            Lista de tuplas (ruta_id, confidence, probabilidades, evaluacion)
+        """
+        votacion = self._votar_anticipado(features_scaled, presupuesto_ms)
+        probabilidades = votacion["probabilidades"]
+        
+        indices = np.argmax(probabilidades, axis=1)
+        self.monitor_drift.registrar(features_scaled, indices)
+        
+        clases = self.modelo.classes_
+        resultados = []
+        for fila, idx_ruta in enumerate(indices):
+            top_indices = np.argsort(probabilidades[fila])[-3:][::-1]
+            prob_dict = {
+                str(int(clases[idx])): float(probabilidades[fila, idx]) for idx in top_indices
+            }
+            motivo = votacion["motivo_parada"][fila]
+            evaluacion = {
+                "arboles_usados": int(votacion["arboles_usados"][fila]),
+                "arboles_totales": int(votacion["arboles_totales"]),
+                # Con "voto_decidido" la ruta coincide con la del bosque completo,
+                # pero las probabilidades son el promedio de los árboles evaluados
+                "ruta_exacta": motivo != "presupuesto",
+                "probabilidades_exactas": motivo is None,
+                "motivo_parada": motivo
+            }
+            resultados.append((
+                int(clases[idx_ruta]),
+                float(probabilidades[fila, idx_ruta]),
+                prob_dict,
+                evaluacion
+            ))
+        return resultados
+    
+    def predecir_anticipado(self, datos: dict,
+                            presupuesto_ms: Optional[float] = None) -> Tuple[int, float, Dict[str, float], dict]:
+        """
+        Realiza una predicción con parada anticipada para un estudiante
+        
+        Args:
+            datos: Diccionario con los datos del estudiante
+            presupuesto_ms: Presupuesto de latencia de la votación en milisegundos
+            
+        Returns:
+            Tupla con (ruta_id, confidence, probabilidades, evaluacion)
+        """
+        if not self.cargado:
+            raise Exception("Modelo no cargado")
+        
+        try:
+            features_scaled = self.scaler.transform(self._preparar_features(datos))
+            return self._resultados_anticipados(features_scaled, presupuesto_ms)[0]
+        except Exception as e:
+            raise Exception(f"Error al realizar la predicción: {str(e)}")
+    
+    def predecir_batch_anticipado(self, lista_datos: list,
+                                  presupuesto_ms: Optional[float] = None) -> List[Optional[tuple]]:
+        """
+        Realiza predicciones con parada anticipada para múltiples estudiantes;
+        solo las filas aún no decididas siguen evaluando árboles
+        
+        Args:
+            lista_datos: Lista de diccionarios con datos de estudiantes
+            presupuesto_ms: Presupuesto de latencia de la votación en milisegundos
+            
+        Returns:
+            Lista de tuplas (ruta_id, confidence, probabilidades, evaluacion)
+            o None para los estudiantes que no se pudieron procesar
+        """
+        if not self.cargado:
+            raise Exception("Modelo no cargado")
+        
+        resultados = [None] * len(lista_datos)
+        filas = []
+        posiciones = []
+        for i, datos in enumerate(lista_datos):
+            try:
+                filas.append(self._preparar_features(datos)[0])
+                posiciones.append(i)
+            except Exception:
+                # En caso de error, se deja None para manejar después
+                pass
+        
+        if filas:
+            features_scaled = self.scaler.transform(np.vstack(filas))
+            for posicion, resultado in zip(posiciones, self._resultados_anticipados(features_scaled, presupuesto_ms)):
+                resultados[posicion] = resultado
+        
+        return resultados
+    
+    def predecir_columnas(self, columnas: Dict[str, np.ndarray], top_k: int = 3,
+                          anticipado: bool = False,
+                          presupuesto_ms: Optional[float] = None) -> Dict[str, np.ndarray]:
+        """
+        Realiza predicciones vectorizadas para un lote en formato columnar
+        
+        Args:
+            columnas: Diccionario campo -> array con los datos de los estudiantes
+            top_k: Número de rutas más probables a devolver por estudiante
+            anticipado: Usar votación con parada anticipada
+            presupuesto_ms: Presupuesto de latencia de la votación anticipada
+            
+        Returns:
+            Diccionario con arrays ruta_recomendada_id, confidence,
+            top_rutas (n, k) y top_probabilidades (n, k); con votación
+            anticipada incluye además arboles_usados, ruta_exacta y probabilidades_exactas
+        """
+        if not self.cargado:
+            raise Exception("Modelo no cargado")
+        
+        try:
+            features_scaled = self.scaler.transform(self._preparar_features_columnas(columnas))
+            votacion = None
+            if anticipado:
+                votacion = self._votar_anticipado(features_scaled, presupuesto_ms)
+                probabilidades = votacion["probabilidades"]
+            else:
+                probabilidades = self._predecir_proba(features_scaled)
+            
+            indices = np.argmax(probabilidades, axis=1)
+            self.monitor_drift.registrar(features_scaled, indices)
+            
+            clases = self.modelo.classes_
+            k = max(1, min(top_k, len(clases)))
+            top_indices = np.argsort(probabilidades, axis=1)[:, ::-1][:, :k]
+            
+            resultados = {
+                "ruta_recomendada_id": clases[indices].astype(np.int64),
+                "confidence": probabilidades[np.arange(len(indices)), indices],
+                "top_rutas": clases[top_indices].astype(np.int64),
+                "top_probabilidades": np.take_along_axis(probabilidades, top_indices, axis=1)
+            }
+            if votacion is not None:
+                resultados["arboles_usados"] = votacion["arboles_usados"]
+                motivos = votacion["motivo_parada"]
+                resultados["ruta_exacta"] = np.array([m != "presupuesto" for m in motivos])
+                resultados["probabilidades_exactas"] = np.array([m is None for m in motivos])
+            
+            return resultados
+            
+        except Exception as e:
+            raise Exception(f"Error al realizar las predicciones: {str(e)}")
+    
     def obtener_info(self) -> dict:
         """
         Obtiene información sobre el modelo cargado
@@ -170,6 +503,46 @@ class PredictorRutas:
             "fecha_entrenamiento": self.metadata.get("fecha_entrenamiento", "Desconocida"),
             "metricas": self.metadata.get("metricas", {}),
             "num_features": self.metadata.get("num_features", 0),
-            "num_clases": self.metadata.get("num_clases", 0)
+            "num_clases": self.metadata.get("num_clases", 0),
+            "modelo_rapido": self._info_destilado()
+        }
+    
+    def _info_destilado(self) -> Optional[dict]:
+        """Resume el estado del modelo rápido y el reparto de respuestas entre niveles"""
+        if self.destilado is None:
+            return None
+        
+        with self._lock_niveles:
+            estadisticas = dict(self.estadisticas_niveles)
+        total = estadisticas["rapido"] + estadisticas["bosque"]
+        return {
+            "umbral": self.umbral_destilado,
+            "respondidas_rapido": estadisticas["rapido"],
+            "escaladas_bosque": estadisticas["bosque"],
+            "tasa_escalamiento": estadisticas["bosque"] / total if total else None
         }
+    
+    def obtener_drift(self) -> dict:
+        """
+        Obtiene los puntajes de drift de las entradas y de las rutas predichas
+        
+        Returns:
+            Diccionario con el reporte de drift
+        """
+        if not self.cargado:
+            return {"error": "Modelo no cargado"}
+        
+        return self.monitor_drift.obtener_reporte()
+    
+    def fijar_baseline_drift(self) -> dict:
+        """
+        Fija el estado actual de los sketches como línea base de drift
+        
+        Returns:
+            Diccionario con la fecha y el total de la línea base
+        """
+        if not self.cargado:
+            raise Exception("Modelo no cargado")
+        
+        return self.monitor_drift.fijar_baseline()
 
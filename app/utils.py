@@ -1,6 +1,7 @@
 """
 Utilidades auxiliares para el procesamiento de datos
 """
+import numpy as np
 from typing import Dict
 
 
@@ -123,6 +124,103 @@ def calcular_features_derivadas(datos: Dict) -> Dict:
     return features
 
 
+def calcular_features_derivadas_columnas(columnas: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """
+    Versión vectorizada de `calcular_features_derivadas` para lotes en formato columnar
+    
+    Args:
+        columnas: Diccionario campo -> array con los datos de todos los estudiantes
+            (los campos opcionales ausentes ya deben venir rellenados con su valor por defecto)
+        
+    Returns:
+        Diccionario feature -> array con todas las features necesarias para el modelo
+    """
+    features = {}
+    
+    # Features básicas directas
+    for campo in ['porcentaje_diagnostico_inicial', 'nivel_motivacion', 'velocidad_progreso',
+                  'ratio_intentos_exitosos', 'mejora_tendencia',
+                  'tiempo_promedio_por_sesion_min', 'confianza_promedio']:
+        features[campo] = columnas[campo]
+    
+    estilo_dom = columnas['estilo_dominante']
+    
+    # Normalizar estilos de aprendizaje; si no se proporcionan, usar estilo_dominante
+    estilo_visual = columnas['estilo_visual']
+    estilo_auditivo = columnas['estilo_auditivo']
+    estilo_kinestesico = columnas['estilo_kinestesico']
+    
+    suma_estilos = estilo_visual + estilo_auditivo + estilo_kinestesico
+    hay_estilos = suma_estilos > 0
+    suma_segura = np.where(hay_estilos, suma_estilos, 1.0)
+    es_mixto = ~np.isin(estilo_dom, ['VISUAL', 'AUDITIVO', 'KINESTESICO'])
+    features['estilo_visual_norm'] = np.where(
+        hay_estilos, estilo_visual / suma_segura,
+        np.where(estilo_dom == 'VISUAL', 1.0, np.where(es_mixto, 0.33, 0.0))
+    )
+    features['estilo_auditivo_norm'] = np.where(
+        hay_estilos, estilo_auditivo / suma_segura,
+        np.where(estilo_dom == 'AUDITIVO', 1.0, np.where(es_mixto, 0.33, 0.0))
+    )
+    features['estilo_kinestesico_norm'] = np.where(
+        hay_estilos, estilo_kinestesico / suma_segura,
+        np.where(estilo_dom == 'KINESTESICO', 1.0, np.where(es_mixto, 0.34, 0.0))
+    )
+    
+    # Calcular desempeño promedio
+    puntuaciones = np.stack([
+        columnas['puntuacion_concepto_basico_promedio'],
+        columnas['puntuacion_concepto_intermedio_promedio'],
+        columnas['puntuacion_concepto_avanzado_promedio']
+    ])
+    num_puntuaciones = (puntuaciones > 0).sum(axis=0)
+    features['desempeno_promedio'] = np.where(
+        num_puntuaciones > 0,
+        puntuaciones.sum(axis=0) / np.maximum(num_puntuaciones, 1),
+        columnas['porcentaje_diagnostico_inicial']
+    )
+    
+    # Calcular tasa de éxito general
+    tasas = np.stack([
+        columnas['tasa_aciertos_basicos'],
+        columnas['tasa_aciertos_intermedios'],
+        columnas['tasa_aciertos_avanzados']
+    ])
+    num_tasas = (tasas > 0).sum(axis=0)
+    features['tasa_exito_general'] = np.where(
+        num_tasas > 0,
+        tasas.sum(axis=0) / np.maximum(num_tasas, 1),
+        columnas['ratio_intentos_exitosos']
+    )
+    
+    # Calcular experiencia (basada en lecciones completadas)
+    features['experiencia'] = columnas['lecciones_completadas'] / np.maximum(columnas['lecciones_totales'], 1)
+    
+    # One-hot encoding para ritmo_aprendizaje
+    ritmo = columnas['ritmo_aprendizaje']
+    for valor in ['LENTO', 'NORMAL', 'RAPIDO']:
+        features[f'ritmo_aprendizaje_{valor}'] = (ritmo == valor).astype(np.float64)
+    
+    # One-hot encoding para nivel_diagnostico_cat
+    porcentaje_diag = columnas['porcentaje_diagnostico_inicial']
+    features['nivel_diagnostico_cat_ALTO'] = (porcentaje_diag >= 70).astype(np.float64)
+    features['nivel_diagnostico_cat_BAJO'] = (porcentaje_diag < 40).astype(np.float64)
+    features['nivel_diagnostico_cat_MEDIO'] = ((porcentaje_diag >= 40) & (porcentaje_diag < 70)).astype(np.float64)
+    
+    # One-hot encoding para nivel_motivacion_cat
+    nivel_mot = columnas['nivel_motivacion']
+    features['nivel_motivacion_cat_ALTA'] = (nivel_mot > 6).astype(np.float64)
+    features['nivel_motivacion_cat_MEDIA'] = (nivel_mot <= 6).astype(np.float64)
+    
+    # One-hot encoding para estilo_dominante
+    features['estilo_dominante_AUDITIVO'] = (estilo_dom == 'AUDITIVO').astype(np.float64)
+    features['estilo_dominante_KINESTESICO'] = (estilo_dom == 'KINESTESICO').astype(np.float64)
+    features['estilo_dominante_MIXTO'] = (estilo_dom == 'MIXTO').astype(np.float64)
+    features['estilo_dominante_VISUAL'] = (estilo_dom == 'VISUAL').astype(np.float64)
+    
+    return features
+
+
 def obtener_nombre_ruta(ruta_id: int) -> str:
     """
     Obtiene el nombre de una ruta basándose en su ID
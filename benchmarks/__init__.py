@@ -0,0 +1,3 @@
+"""
+Scripts de benchmark de la API
+"""
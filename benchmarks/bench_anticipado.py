@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la votación con parada anticipada frente al bosque completo:
+árboles evaluados en promedio, latencia ahorrada y acuerdo con la predicción exacta
+
+Uso:
+    python benchmarks/bench_anticipado.py --estudiantes 2000 --presupuesto-ms 5
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from app.predictor import PredictorRutas
+from app.formatos import leer_columnas, MIME_JSON
+from benchmarks.datos_sinteticos import generar_estudiantes
+
+
+def percentiles(tiempos: list) -> str:
+    """Formatea p50/p99 en milisegundos"""
+    ms = np.array(tiempos) * 1000
+    return f"p50 {np.percentile(ms, 50):7.2f} ms  p99 {np.percentile(ms, 99):7.2f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--estudiantes", type=int, default=2000)
+    parser.add_argument("--presupuesto-ms", type=float, default=None)
+    args = parser.parse_args()
+
+    predictor = PredictorRutas(modelos_dir=os.getenv("MODELOS_DIR", os.path.join(BASE_DIR, "modelos")))
+    # La referencia es el bosque completo: se desactiva el modelo rápido destilado
+    predictor.destilado = None
+    estudiantes = generar_estudiantes(args.estudiantes)
+
+    # Filas individuales
+    tiempos_completo, tiempos_anticipado = [], []
+    arboles, acuerdos, exactas = [], 0, 0
+    for datos in estudiantes:
+        inicio = time.perf_counter()
+        ruta_completa = predictor.predecir(datos)[0]
+        tiempos_completo.append(time.perf_counter() - inicio)
+
+        inicio = time.perf_counter()
+        ruta, _, _, evaluacion = predictor.predecir_anticipado(datos, args.presupuesto_ms)
+        tiempos_anticipado.append(time.perf_counter() - inicio)
+
+        arboles.append(evaluacion["arboles_usados"])
+        acuerdos += ruta == ruta_completa
+        exactas += evaluacion["probabilidades_exactas"]
+
+    total_arboles = evaluacion["arboles_totales"]
+    print(f"Filas individuales ({len(estudiantes)} estudiantes, {total_arboles} árboles)")
+    print(f"  completo:   {percentiles(tiempos_completo)}")
+    print(f"  anticipado: {percentiles(tiempos_anticipado)}")
+    print(f"  árboles promedio: {np.mean(arboles):.1f} / {total_arboles}")
+    print(f"  acuerdo con el bosque completo: {acuerdos / len(estudiantes):.2%}")
+    print(f"  evaluaciones exactas (todos los árboles): {exactas / len(estudiantes):.2%}")
+
+    # Lote completo: los dos caminos son vectorizados y parten de las mismas
+    # columnas ya validadas, así la diferencia medida es solo la parada anticipada
+    columnas = leer_columnas(json.dumps({"estudiantes": estudiantes}).encode('utf-8'), MIME_JSON)
+
+    inicio = time.perf_counter()
+    completo = predictor.predecir_columnas(columnas)
+    tiempo_completo = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    anticipado = predictor.predecir_columnas(columnas, anticipado=True, presupuesto_ms=args.presupuesto_ms)
+    tiempo_anticipado = time.perf_counter() - inicio
+
+    acuerdo_lote = np.mean(anticipado["ruta_recomendada_id"] == completo["ruta_recomendada_id"])
+    print(f"Lote de {len(estudiantes)} estudiantes (vectorizado)")
+    print(f"  completo:   {tiempo_completo * 1000:9.1f} ms")
+    print(f"  anticipado: {tiempo_anticipado * 1000:9.1f} ms")
+    print(f"  árboles promedio: {np.mean(anticipado['arboles_usados']):.1f} / {total_arboles}")
+    print(f"  acuerdo con el bosque completo: {acuerdo_lote:.2%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Benchmark de /predict/batch por formato: tamaño de payload y tiempo extremo a extremo
+
+Uso:
+    python benchmarks/bench_formatos.py --estudiantes 5000 --repeticiones 5
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from app.main import app, predictor
+from app.formatos import MIME_JSON, MIME_MSGPACK, MIME_ARROW, msgpack, pa
+from benchmarks.datos_sinteticos import generar_estudiantes
+
+
+def codificar(estudiantes: list, formato: str) -> bytes:
+    """Codifica el lote en el formato indicado"""
+    if formato == MIME_MSGPACK:
+        return msgpack.packb({"estudiantes": estudiantes}, use_bin_type=True)
+    if formato == MIME_ARROW:
+        tabla = pa.Table.from_pylist(estudiantes)
+        sink = io.BytesIO()
+        with pa.ipc.new_stream(sink, tabla.schema) as writer:
+            writer.write_table(tabla)
+        return sink.getvalue()
+    return json.dumps({"estudiantes": estudiantes}).encode("utf-8")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--estudiantes", type=int, default=5000)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+
+    if predictor is None or not predictor.cargado:
+        print("El modelo no está disponible; revisa la carpeta 'modelos/'")
+        sys.exit(1)
+
+    estudiantes = generar_estudiantes(args.estudiantes)
+    cliente = app.test_client()
+
+    formatos = [MIME_JSON]
+    if msgpack is not None:
+        formatos.append(MIME_MSGPACK)
+    if pa is not None:
+        formatos.append(MIME_ARROW)
+
+    print(f"{'formato':<38} {'request (KB)':>12} {'response (KB)':>13} {'ms/lote':>9}")
+    for formato in formatos:
+        cuerpo = codificar(estudiantes, formato)
+        tiempos = []
+        for _ in range(args.repeticiones):
+            inicio = time.perf_counter()
+            respuesta = cliente.post(
+                "/predict/batch",
+                data=cuerpo,
+                headers={"Content-Type": formato, "Accept": formato}
+            )
+            tiempos.append(time.perf_counter() - inicio)
+            if respuesta.status_code != 200:
+                print(f"{formato}: error {respuesta.status_code} {respuesta.get_data(as_text=True)[:200]}")
+                break
+        else:
+            tiempos.sort()
+            print(
+                f"{formato:<38} {len(cuerpo) / 1024:>12.1f} "
+                f"{len(respuesta.get_data()) / 1024:>13.1f} {tiempos[len(tiempos) // 2] * 1000:>9.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
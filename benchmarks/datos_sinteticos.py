@@ -0,0 +1,34 @@
+"""
+Generación de estudiantes sintéticos para los benchmarks
+"""
+import random
+
+
+def generar_estudiantes(n: int, semilla: int = 42) -> list:
+    """Genera estudiantes sintéticos dentro de los rangos de `DatosEstudiante`"""
+    rng = random.Random(semilla)
+    estudiantes = []
+    for _ in range(n):
+        estudiantes.append({
+            "porcentaje_diagnostico_inicial": round(rng.uniform(0, 100), 1),
+            "nivel_motivacion": rng.randint(1, 9),
+            "ritmo_aprendizaje": rng.choice(["LENTO", "NORMAL", "RAPIDO"]),
+            "estilo_dominante": rng.choice(["VISUAL", "AUDITIVO", "KINESTESICO", "MIXTO"]),
+            "velocidad_progreso": round(rng.uniform(0, 10), 2),
+            "ratio_intentos_exitosos": round(rng.random(), 2),
+            "mejora_tendencia": round(rng.uniform(-1, 1), 2),
+            "estilo_visual": rng.randint(0, 100),
+            "estilo_auditivo": rng.randint(0, 100),
+            "estilo_kinestesico": rng.randint(0, 100),
+            "puntuacion_concepto_basico_promedio": round(rng.uniform(0, 100), 1),
+            "puntuacion_concepto_intermedio_promedio": round(rng.uniform(0, 100), 1),
+            "puntuacion_concepto_avanzado_promedio": round(rng.uniform(0, 100), 1),
+            "tasa_aciertos_basicos": round(rng.random(), 2),
+            "tasa_aciertos_intermedios": round(rng.random(), 2),
+            "tasa_aciertos_avanzados": round(rng.random(), 2),
+            "lecciones_completadas": rng.randint(0, 20),
+            "lecciones_totales": 20,
+            "tiempo_promedio_por_sesion_min": round(rng.uniform(5, 60), 1),
+            "confianza_promedio": round(rng.random(), 2)
+        })
+    return estudiantes